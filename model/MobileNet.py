@@ -229,9 +229,8 @@ class RGB_net(nn.Module):
         """
         gap, y = self.net(x)
         # print('[RGB-backbone]\ty_rgb: {}'.format(y.size()))
-        gap = func.sigmoid(gap)
         # print('[RGB-backbone]\ty_rgb: {}\tgap_rgb: {}'.format(y.size(), gap.size()))
-        p = func.sigmoid(y)
+        p = y    # logit, sigmoid is folded into the loss
         return gap, p
 
 
@@ -256,7 +255,6 @@ class Depth_net(nn.Module):
         """
         gap, y = self.net(x)
         # print('[D-backbone]\ty_d: {}'.format(y.size()))
-        gap = func.sigmoid(gap)
         #print('[D-backbone]\ty_d: {}\tgap_d: {}'.format(y.size(), gap.size()))
-        q = func.sigmoid(y)
+        q = y    # logit, sigmoid is folded into the loss
         return gap, q
\ No newline at end of file
@@ -15,8 +15,7 @@ class RGB_net(nn.Module):
         self.classifier = nn.Sequential(
             # nn.BatchNorm1d(512, eps=1e-05, momentum=0.1, affine=True, track_running_stats=True),
             # nn.ReLU(inplace=True),
-            nn.Linear(512,1),
-            nn.Sigmoid()
+            nn.Linear(512,1),   # logit, sigmoid is folded into the loss
         )
 
     def forward(self, x):
@@ -26,8 +25,7 @@ class RGB_net(nn.Module):
         """
         y = self.net(x)
         # print('[RGB-backbone]\ty_rgb: {}'.format(y.size()))
-        gap = self.gavg_pool(y).squeeze()
-        gap = func.sigmoid(gap)
+        gap = torch.flatten(self.gavg_pool(y), 1)
         # print('[RGB-backbone]\ty_rgb: {}\tgap_rgb: {}'.format(y.size(), gap.size()))
         p = self.classifier(gap)
         return gap, p
@@ -44,8 +42,7 @@ class Depth_net(nn.Module):
         self.classifier = nn.Sequential(
             # nn.BatchNorm1d(512, eps=1e-05, momentum=0.1, affine=True, track_running_stats=True),
             # nn.ReLU(inplace=True),
-            nn.Linear(512,1),
-            nn.Sigmoid()
+            nn.Linear(512,1),   # logit, sigmoid is folded into the loss
         )
     
     def forward(self, x):
@@ -55,8 +52,7 @@ class Depth_net(nn.Module):
         """
         y = self.net(x)
         # print('[D-backbone]\ty_d: {}'.format(y.size()))
-        gap = self.gavg_pool(y).squeeze()
-        gap = func.sigmoid(gap)
+        gap = torch.flatten(self.gavg_pool(y), 1)
         #print('[D-backbone]\ty_d: {}\tgap_d: {}'.format(y.size(), gap.size()))
         q = self.classifier(gap)
         return gap, q
@@ -153,8 +153,7 @@ class RGB_net(nn.Module):
         super(RGB_net, self).__init__()
         self.net = squeezenet1_1()
         self.classifier = nn.Sequential(
-            nn.Linear(1000,1),
-            nn.Sigmoid()
+            nn.Linear(1000,1),  # logit, sigmoid is folded into the loss
         )
 
     def forward(self, x):
@@ -164,7 +163,7 @@ class RGB_net(nn.Module):
         """
         y = self.net(x)
         # print('[RGB-backbone]\ty_rgb: {}'.format(y.size()))
-        gap = func.sigmoid(y)
+        gap = y
         # print('[RGB-backbone]\ty_rgb: {}\tgap_rgb: {}'.format(y.size(), gap.size()))
         p = self.classifier(gap)
         return gap, p
@@ -175,8 +174,7 @@ class Depth_net(nn.Module):
         super(Depth_net, self).__init__()
         self.net = squeezenet1_1(in_type='Depth')
         self.classifier = nn.Sequential(
-            nn.Linear(1000,1),
-            nn.Sigmoid()
+            nn.Linear(1000,1),  # logit, sigmoid is folded into the loss
         )
     
     def forward(self, x):
@@ -186,7 +184,7 @@ class Depth_net(nn.Module):
         """
         y = self.net(x)
         # print('[D-backbone]\ty_d: {}'.format(y.size()))
-        gap = func.sigmoid(y)
+        gap = y
         #print('[D-backbone]\ty_d: {}\tgap_d: {}'.format(y.size(), gap.size()))
         q = self.classifier(gap)
         return gap, q
\ No newline at end of file
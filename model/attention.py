@@ -30,7 +30,10 @@ class Sim_AM(torch.nn.Module):
         x_minus_mu_square = (x - x.mean(dim=[2,3], keepdim=True)).pow(2)
         y = x_minus_mu_square / (4 * (x_minus_mu_square.sum(dim=[2,3], keepdim=True) / n + self.e_lambda)) + 0.5
 
-        return x * self.activaton(y)
+        if torch.is_grad_enabled():
+            return x * self.activaton(y)
+        # inference: no graph to keep x for, scale it in place (the input is overwritten)
+        return x.mul_(self.activaton(y))
 
 
 """
@@ -1,9 +1,10 @@
 import torch
 from torch import Tensor
 import torch.nn as nn
+import torch.nn.functional as func
 from typing import Type, Any, Callable, Union, List, Optional
 
-from .conv import CD_Conv2d
+from .conv import CD_Conv2d, fuse_conv_bn
 from .attention import Sim_AM
 
 
@@ -12,11 +13,12 @@ DenseNet
 """
 def transition_block(in_channels, out_channels):
     """control the number of channels"""
+    # pooling before the 1x1 conv is the same math on 1/4 of the pixels
     blk = nn.Sequential(
             nn.BatchNorm2d(in_channels), 
-            nn.ReLU(),
-            nn.Conv2d(in_channels, out_channels, kernel_size=1),
-            nn.AvgPool2d(kernel_size=2, stride=2))
+            nn.ReLU(inplace=True),
+            nn.AvgPool2d(kernel_size=2, stride=2),
+            nn.Conv2d(in_channels, out_channels, kernel_size=1))
     return blk
 
 
@@ -80,11 +82,8 @@ class BasicBlock(nn.Module):
         self.bn2 = norm_layer(planes)
         self.downsample = downsample
         self.stride = stride
-        if att_mod == 'SimAM': # [+]
-            self.conv2 = nn.Sequential(
-                self.conv2,
-                Sim_AM(planes)
-            )                                                                                   
+        # attention after bn2 so that bn2 can be folded into conv2 for inference
+        self.att = Sim_AM(planes) if att_mod == 'SimAM' else nn.Identity() # [+]
 
     def forward(self, x: Tensor) -> Tensor:
         """
@@ -98,15 +97,25 @@ class BasicBlock(nn.Module):
 
         out = self.conv2(out)
         out = self.bn2(out)
+        out = self.att(out)
 
         if self.downsample is not None:
             identity = self.downsample(x)
 
-        out += identity
+        out = out.add_(identity)
         out = self.relu(out)
 
         return out
 
+    def fuse_bn(self) -> None:
+        """
+        Fold BN into the preceding conv for inference
+        """
+        self.conv1, self.bn1 = fuse_conv_bn(self.conv1, self.bn1), nn.Identity()
+        self.conv2, self.bn2 = fuse_conv_bn(self.conv2, self.bn2), nn.Identity()
+        if self.downsample is not None:
+            self.downsample = _fuse_downsample(self.downsample)
+
 
 class Bottleneck(nn.Module):
     # Bottleneck in torchvision places the stride for downsampling at 3x3 convolution(self.conv2)
@@ -160,11 +169,28 @@ class Bottleneck(nn.Module):
         if self.downsample is not None:
             identity = self.downsample(x)
 
-        out += identity
+        out = out.add_(identity)
         out = self.relu(out)
 
         return out
 
+    def fuse_bn(self) -> None:
+        """
+        Fold BN into the preceding conv for inference
+        """
+        self.conv1, self.bn1 = fuse_conv_bn(self.conv1, self.bn1), nn.Identity()
+        self.conv2, self.bn2 = fuse_conv_bn(self.conv2, self.bn2), nn.Identity()
+        self.conv3, self.bn3 = fuse_conv_bn(self.conv3, self.bn3), nn.Identity()
+        if self.downsample is not None:
+            self.downsample = _fuse_downsample(self.downsample)
+
+
+def _fuse_downsample(downsample: nn.Sequential) -> nn.Sequential:
+    """(conv1x1, bn) -> (conv1x1,)"""
+    if len(downsample) == 1:    # already fused
+        return downsample
+    return nn.Sequential(fuse_conv_bn(downsample[0], downsample[1]))
+
 
 class ResNet(nn.Module):
 
@@ -226,7 +252,6 @@ class ResNet(nn.Module):
                                        dilate=replace_stride_with_dilation[2], att_mod=att_mod)
         self.avgpool = nn.AdaptiveAvgPool2d((1, 1))
         self.fc = nn.Linear(512 * block.expansion, num_classes)
-        self.downsample_8x8 = nn.Upsample(size=(4, 4), mode='bilinear') # [+] {batchsize:32, wh:128} -> 8
         # [+] mulit-scale fusion
         # self.downsample1_7x7 = nn.Sequential(
         #     nn.Upsample(size=(7,7), mode='bilinear'),
@@ -307,17 +332,18 @@ class ResNet(nn.Module):
 
         x = self.layer1(x)  # (B,64,56,56) -> (B,64,56,56)
         # print('[backbone]\tlayer1: {}\t'.format(x.size()))
-        x1 = self.downsample_8x8(x) # [+]
+        x1 = func.adaptive_avg_pool2d(x, 4) # [+] {wh:128} -> 4x4
         x = self.layer2(x)  # (B,64,56,56) -> (B,128,28,28)
         # print('[backbone]\tlayer2: {}\t'.format(x.size()))
-        x2 = self.downsample_8x8(x) # [+]
+        x2 = func.adaptive_avg_pool2d(x, 4) # [+]
         x = self.layer3(x)  # (B,256,14,14) -> (B,512,14,14)
         # print('[backbone]\tlayer3: {}\t'.format(x.size()))
-        x3 = self.downsample_8x8(x) # [+]
+        x3 = func.adaptive_avg_pool2d(x, 4) # [+]
         x = self.layer4(x)  # (B,256,14,14) -> (B,512,7,7)
         # x = self._norm_layer(512)
         # print('[backbone]\tlayer4: {}\t'.format(x.size()))
-        x = torch.cat([x1,x2,x3,x], dim=1) # [+]
+        x4 = func.adaptive_avg_pool2d(x, 4) # [+] no-op for 128x128 inputs
+        x = torch.cat([x1,x2,x3,x4], dim=1) # [+] single copy kernel; Inductor elides it under torch.compile
         # x = self.avgpool(x)
         # x = torch.flatten(x, 1)
         # x = self.fc(x)
@@ -327,6 +353,15 @@ class ResNet(nn.Module):
     def forward(self, x: Tensor) -> Tensor:
         return self._forward_impl(x)
 
+    def fuse_bn(self) -> None:
+        """
+        Fold every Conv+BN pair into a single conv. Only valid in eval mode.
+        """
+        self.conv1, self.bn1 = fuse_conv_bn(self.conv1, self.bn1), nn.Identity()
+        for m in list(self.modules()):
+            if isinstance(m, (BasicBlock, Bottleneck)):
+                m.fuse_bn()
+
 
 def _resnet(
     arch: str,
@@ -389,9 +424,6 @@ def resnet50(pretrained: bool = False, progress: bool = True, **kwargs: Any) ->
 
 
 
-import torch.nn.functional as func
-
-
 class RGB_net(nn.Module):
     def __init__(self):
         super(RGB_net, self).__init__()
@@ -402,19 +434,20 @@ class RGB_net(nn.Module):
         # self.net = nn.Sequential(*features_rgb[0:8])
         self.gavg_pool = nn.AdaptiveAvgPool2d(1)
         self.classifier = nn.Sequential(
-            nn.Linear(960,1),
-            nn.Sigmoid()
+            nn.Linear(960,1),   # logit, sigmoid is folded into the loss
         )
 
     def forward(self, x):
         """
         Args:
             x: rgb-image. (B,3,224,224)
+        Returns:
+            gap: pooled features. (B,960)
+            p: logit of live. (B,1)
         """
         y = self.net(x)
         # print('[RGB-backbone]\ty_rgb: {}'.format(y.size()))
-        gap = self.gavg_pool(y).squeeze()
-        gap = func.sigmoid(gap)
+        gap = torch.flatten(self.gavg_pool(y), 1) # [B,960,1,1] -> [B,960], also for B=1
         # print('[RGB-backbone]\ty_rgb: {}\tgap_rgb: {}'.format(y.size(), gap.size()))
         p = self.classifier(gap)
         return gap, p
@@ -439,19 +472,20 @@ class Depth_net(nn.Module):
         # self.net = nn.Sequential(*features_d[0:8])
         self.gavg_pool = nn.AdaptiveAvgPool2d(1)
         self.classifier = nn.Sequential(
-            nn.Linear(960,1),
-            nn.Sigmoid()
+            nn.Linear(960,1),   # logit, sigmoid is folded into the loss
         )
     
     def forward(self, x):
         """
         Args:
             x: d-image. (B,1,128,128)
+        Returns:
+            gap: pooled features. (B,960)
+            q: logit of live. (B,1)
         """
         y = self.net(x)
         # print('[D-backbone]\ty_d: {}'.format(y.size()))
-        gap = self.gavg_pool(y).squeeze()
-        gap = func.sigmoid(gap)
+        gap = torch.flatten(self.gavg_pool(y), 1) # [B,960,1,1] -> [B,960], also for B=1
         #print('[D-backbone]\ty_d: {}\tgap_d: {}'.format(y.size(), gap.size()))
         q = self.classifier(gap)
         return gap, q
\ No newline at end of file
@@ -3,6 +3,7 @@ import math
 import torch
 import torch.nn as nn
 import torch.nn.functional as func
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 
 class CD_Conv2d(nn.Module):
@@ -29,3 +30,38 @@ class CD_Conv2d(nn.Module):
             kernel_diff = kernel_diff[:, :, None, None]
             out_diff = func.conv2d(input=x, weight=kernel_diff, bias=self.conv.bias, stride=self.conv.stride, padding=0, groups=self.conv.groups)
             return out_normal - self.theta * out_diff
+
+    @torch.no_grad()
+    def absorb_bn(self, bn):
+        """
+        Fold an eval-mode BatchNorm that follows this conv into weight & bias
+        """
+        if math.fabs(1.0 - self.theta) < 1e-8:
+            raise ValueError('cannot absorb BatchNorm into CD_Conv2d with theta=1')
+        std = torch.sqrt(bn.running_var + bn.eps)
+        gamma = bn.weight if bn.affine else torch.ones_like(std)
+        beta = bn.bias if bn.affine else torch.zeros_like(std)
+        scale = gamma / std
+        bias = self.conv.bias if self.conv.bias is not None else torch.zeros_like(std)
+        # W' = W·γ/σ scales both conv(x) and the central difference term,
+        # while the bias appears in both of them: out = conv(x)+b - θ(diff(x)+b)
+        self.conv.weight.mul_(scale.reshape(-1, 1, 1, 1))
+        shift = ((1 - self.theta) * bias - bn.running_mean) * scale + beta
+        self.conv.bias = nn.Parameter(shift / (1 - self.theta))
+
+
+def fuse_conv_bn(conv, bn):
+    """
+    Fuse conv -> bn for inference
+    Args:
+        conv: nn.Conv2d or CD_Conv2d
+        bn: eval-mode nn.BatchNorm2d following the conv, or nn.Identity if already fused
+    Returns:
+        conv with bn folded into its weight & bias
+    """
+    if isinstance(bn, nn.Identity):
+        return conv
+    if isinstance(conv, CD_Conv2d):
+        conv.absorb_bn(bn)
+        return conv
+    return fuse_conv_bn_eval(conv, bn)
@@ -1,6 +1,7 @@
 import math
 
 import torch
+import torch._dynamo
 import torch.nn as nn
 
 # from .SqueezeNet import RGB_net, Depth_net
@@ -11,6 +12,27 @@ import torch.nn as nn
 from .cd_resnet import RGB_net, Depth_net
 
 
+@torch.no_grad()
+def _flatten_params(module):
+    """
+    Repack the trainable parameters into one contiguous arena, each parameter becomes a view into it.
+    4D conv weights are laid out as [N,H,W,C] in the arena, i.e. their views are channels_last.
+    A later .to(dtype/device) or .half() gives every parameter its own storage again, and so do
+    layers replaced by fuse_bn(); call this again afterwards (fuse_bn() does so itself).
+    """
+    params = [p for p in module.parameters() if p.requires_grad]
+    if len(params) == 0:
+        return
+    chunks = [p.permute(0, 2, 3, 1) if p.dim() == 4 else p for p in params]
+    # private, unversioned API (wraps torch._C._nn.flatten_dense_tensors); written against the pinned torch 2.1
+    arena = torch._utils._flatten_dense_tensors(chunks)
+    offset = 0
+    for p, chunk in zip(params, chunks):
+        view = arena[offset:offset + chunk.numel()].view(chunk.shape)
+        p.data = view.permute(0, 3, 1, 2) if p.dim() == 4 else view
+        offset += chunk.numel()
+
+
 class RGBD_model(nn.Module):
     """
     RGB-D Architecture
@@ -25,27 +47,38 @@ class RGBD_model(nn.Module):
         self.depth_net = Depth_net().to(device)
         self.classifier = nn.Sequential(
             # nn.Sigmoid(),
-            nn.Linear(1920,1), # diy by backbone
-            nn.Sigmoid()
-        )
+            nn.Linear(1920,1), # diy by backbone. logit, sigmoid is folded into the loss
+        ).to(device)    # every parameter must be on one device before _flatten_params
+        # NHWC keeps convs on the Tensor Core kernels without layout transposes
+        self.rgb_net = self.rgb_net.to(memory_format=torch.channels_last)
+        self.depth_net = self.depth_net.to(memory_format=torch.channels_last)
+        self._streams = None    # (rgb, depth) side streams, created on first use
+        self.early_exit = False # eval only: skip depth for samples with a saturated rgb score
+        _flatten_params(self)
 
     def forward(self, x_rgb, x_d):
         """"
         Args:
             x_rgb: rgb-image. [B,3,W,W]
-            x_d: d-image. [B,3,W,W]
+            x_d: d-image. [B,1,W,W]
         Returns:
-            p: prob of live in rgb
-            q: prob of live in depth
-            r: prob of live. the final score.
+            p: logit of live in rgb
+            q: logit of live in depth
+            r: logit of live. sigmoid(r) is the final score.
         """
-        x_d = x_d[:,0:1,:,:]
+        x_rgb = x_rgb.contiguous(memory_format=torch.channels_last)
+        x_d = x_d.contiguous(memory_format=torch.channels_last)
         # print('[RGBD-backbone]\tx_rgb: {}\tx_d: {}'.format(x_rgb.size(), x_d.size()))
-        gap_rgb, p = self.rgb_net(x_rgb)
-        # print('[RGB-head]\tgap_rgb: {}\tp: {}'.format(gap_rgb.size(), p.size()))
-        
-        gap_d, q = self.depth_net(x_d)
-        # print('[D-head]\tgap_d: {}\tq: {}'.format(gap_d.size(), q.size()))
+        if self.early_exit and not self.training:
+            return self._forward_early_exit(x_rgb, x_d)
+        if x_rgb.is_cuda and not self.training and not torch._dynamo.is_compiling():
+            (gap_rgb, p), (gap_d, q) = self._forward_branches_on_streams(x_rgb, x_d)
+        else:
+            gap_rgb, p = self.rgb_net(x_rgb)
+            # print('[RGB-head]\tgap_rgb: {}\tp: {}'.format(gap_rgb.size(), p.size()))
+            
+            gap_d, q = self.depth_net(x_d)
+            # print('[D-head]\tgap_d: {}\tq: {}'.format(gap_d.size(), q.size()))
 
         gap = torch.cat([gap_rgb,gap_d], dim=1)
         r = self.classifier(gap)
@@ -54,3 +87,62 @@ class RGBD_model(nn.Module):
         # print('[RGBD-head]\t q:\t',output[3].squeeze(1))
         # print('[RGBD-head]\t r:\t',output[1].squeeze(1))
         return gap, r, p, q
+
+    def _forward_branches_on_streams(self, x_rgb, x_d):
+        """
+        Run the two independent backbones concurrently on their own CUDA streams
+        Returns:
+            (gap_rgb, p), (gap_d, q)
+        """
+        if self._streams is None:
+            self._streams = (torch.cuda.Stream(x_rgb.device), torch.cuda.Stream(x_rgb.device))
+        main_stream = torch.cuda.current_stream(x_rgb.device)
+        outputs = []
+        for stream, net, x in zip(self._streams, (self.rgb_net, self.depth_net), (x_rgb, x_d)):
+            stream.wait_stream(main_stream)
+            with torch.cuda.stream(stream):
+                outputs.append(net(x))
+        for stream in self._streams:
+            main_stream.wait_stream(stream)
+        # outputs were allocated on the side streams but are consumed on the main one
+        for out in outputs:
+            for t in out:
+                t.record_stream(main_stream)
+        return outputs
+
+    def _forward_early_exit(self, x_rgb, x_d):
+        """
+        Run the depth branch only on samples whose rgb score is in (0.01, 0.99).
+        Confident samples keep the rgb logit as q and r, and zeros as depth features.
+        """
+        gap_rgb, p = self.rgb_net(x_rgb)
+        prob = torch.sigmoid(p.float()).squeeze(1)
+        mask = (prob > 0.01) & (prob < 0.99) # [B]
+        gap_d = torch.zeros_like(gap_rgb)
+        q = p.clone()
+        if mask.any():
+            gap_d_sub, q_sub = self.depth_net(x_d[mask].contiguous(memory_format=torch.channels_last))
+            gap_d[mask] = gap_d_sub.to(gap_d.dtype)
+            q[mask] = q_sub.to(q.dtype)
+        gap = torch.cat([gap_rgb,gap_d], dim=1)
+        r = torch.where(mask[:, None], self.classifier(gap), p)
+        return gap, r, p, q
+
+    def __getstate__(self):
+        # cuda streams can't be pickled by torch.save(model)
+        state = self.__dict__.copy()
+        state['_streams'] = None
+        return state
+
+    def fuse_bn(self):
+        """
+        Fold the BN layers of both backbones into their convs for inference
+        """
+        if self.training:
+            raise RuntimeError('fuse_bn() requires eval mode, call model.eval() first')
+        for branch in (self.rgb_net, self.depth_net):
+            if hasattr(branch.net, 'fuse_bn'):  # only cd_resnet backbones support folding
+                branch.net.fuse_bn()
+        # fused biases and the copied downsample convs live outside the arena, repack for inference
+        _flatten_params(self)
+        return self
@@ -7,19 +7,84 @@ import torch
 import torch.nn as nn
 from torch.nn.functional import leaky_relu
 from torch.utils.data import DataLoader
-from torchvision import transforms
+from torchvision.transforms import v2
 # from torch.utils.tensorboard import SummaryWriter
 
+from model.rgbd_model import RGBD_model
 from util.preprocessor import CASIA_SURF, read_cfg, CASIA_CEFA
 from util.metric import FASMetric
 
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+torch.backends.cudnn.benchmark = True   # fixed input shape, let cudnn pick the fastest NHWC kernels
+torch.set_float32_matmul_precision('high')  # TF32 on Ampere+
 cfg = read_cfg(cfg_file="./config.yml")
 data_cfg = cfg['dataset']
 test_cfg = cfg['test']
 root_dir = os.path.dirname(os.path.abspath(__file__))
 save_path = os.path.join(root_dir, 'exp', 'save', test_cfg['model'])
+amp_dtype = torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16
+
+
+def autocast():
+    """
+    Mixed precision context for inference, runs conv/matmul on Tensor Cores
+    """
+    # cast cache off: it has no effect per forward and is unsafe under graph capture
+    return torch.autocast(device_type=device.type, dtype=amp_dtype, cache_enabled=False,
+                          enabled=test_cfg['amp'] and device.type == 'cuda')
+
+
+def build_eval_transform(mean, std):
+    """
+    Deterministic, tensor-native ops on uint8 [C,H,W], no PIL round trip
+    Args:
+        mean, std: per-channel normalization
+    """
+    return v2.Compose([
+        v2.ToImage(),
+        v2.Resize(test_cfg['rgb_size'], antialias=True),
+        v2.ToDtype(torch.float32, scale=True),
+        v2.Normalize(mean, std),
+    ])
+
+
+def compile_tensorrt(model):
+    """
+    Build a fp16 TensorRT engine of the model, batch size in [1, batch_size]
+    The model and its inputs stay fp32, enabled_precisions lets TRT pick fp16 kernels inside.
+    Written against the torch_tensorrt 2.1 dynamo API (matching the pinned torch 2.1), not pinned.
+    """
+    import torch_tensorrt     # optional dependency, only needed for this backend
+    B, (H, W) = test_cfg['batch_size'], test_cfg['rgb_size']
+    inputs = [
+        torch_tensorrt.Input(min_shape=(1, c, H, W), opt_shape=(B, c, H, W), max_shape=(B, c, H, W), dtype=torch.float32)
+        for c in (3, 1)   # rgb, depth
+    ]
+    return torch_tensorrt.compile(model, ir="dynamo", inputs=inputs, enabled_precisions={torch.half})
+
+
+def capture_graph(model, rgb_static, depth_static):
+    """
+    Capture one forward pass into a CUDA graph
+    Args:
+        rgb_static, depth_static: input buffers reused by every replay
+    Returns:
+        graph: torch.cuda.CUDAGraph
+        output_static: (gap, r, p, q) written by every replay
+    """
+    s = torch.cuda.Stream()
+    s.wait_stream(torch.cuda.current_stream())
+    with torch.cuda.stream(s):
+        for _ in range(3):
+            with autocast():
+                model(rgb_static, depth_static)
+    torch.cuda.current_stream().wait_stream(s)
+    graph = torch.cuda.CUDAGraph()
+    with torch.cuda.graph(graph):
+        with autocast():
+            output_static = model(rgb_static, depth_static)
+    return graph, output_static
 
 
 def calc_acc(pred, label):
@@ -27,65 +92,100 @@ def calc_acc(pred, label):
     Args:
         perd: tensor.
         label: tensor.
+    Returns:
+        acc: 0-dim tensor on the same device, no host sync
     """
-    err = torch.mean(torch.sum(torch.abs(label-pred)) / len(label))
-    acc = 1 - err
+    acc = (pred == label).float().mean()
     return acc
 
 
 if __name__ == '__main__':\
     # data
-    train_transform = transforms.Compose([
-        transforms.ToPILImage(),
-        transforms.RandomResizedCrop(test_cfg['rgb_size'][0]),
-        transforms.Resize(test_cfg['rgb_size']),
-        transforms.ToTensor(),
-        transforms.Normalize(data_cfg['mean'], data_cfg['std']),
-    ])
+    eval_transform = [
+        build_eval_transform(data_cfg['mean'], data_cfg['std']),
+        build_eval_transform(data_cfg['depth_mean'], data_cfg['depth_std']),  # single-channel depth
+    ]
     # test_set = CASIA_SURF(
     #     root_dir=os.path.join(root_dir, 'dataset', data_cfg['name'], 'val'),
     #     csv_file=data_cfg['val_csv'],
-    #     transform=[train_transform, train_transform]
+    #     transform=eval_transform
     # )
     test_set = CASIA_SURF(
         root_dir=os.path.join(root_dir, 'dataset', data_cfg['name'], 'test'),
         csv_file=data_cfg['test_csv'],
-        transform=[train_transform, train_transform]
+        transform=eval_transform
     )
     # test_set = CASIA_CEFA(
     #     root_dir=os.path.join(root_dir, 'dataset', 'CASIA-CEFA', 'train'),
     #     csv_file='4@3_train.txt',
-    #     transform=[train_transform, train_transform],
+    #     transform=eval_transform,
     #     # smoothing=True
     # )
     test_loader = DataLoader(
         dataset=test_set,
         batch_size=test_cfg['batch_size'],
         shuffle=True,
-        num_workers=4
+        num_workers=os.cpu_count(),
+        pin_memory=True,
+        persistent_workers=True,
+        prefetch_factor=4
     )
     # testing
-    model = torch.load(save_path).to(device)
+    model = RGBD_model(device).to(device)
+    model.load_state_dict(torch.load(save_path, map_location=device, weights_only=True))
+    model.eval().fuse_bn()
+    model.early_exit = test_cfg['early_exit']
     print('Using {} device for training.\nModel:\n{}'.format(device, list(model.children())))
+    if test_cfg['early_exit'] and test_cfg['tensorrt']:
+        raise ValueError('test.early_exit has data-dependent shapes and can not be exported to TensorRT, '
+                         'disable one of early_exit/tensorrt in config.yml')
+    # early exit would graph-break and recompile for every depth sub-batch size
+    use_compile = test_cfg['compile'] and not test_cfg['tensorrt'] and not test_cfg['early_exit']
+    if test_cfg['tensorrt']:
+        model = compile_tensorrt(model)
+    elif use_compile:
+        model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
     metric = FASMetric()
-    start_time = datetime.now()
-    # writer = SummaryWriter(cfg['log_dir'])
-    for i, (rgb_map, depth_map, label) in enumerate(test_loader):
-        rgb_map, depth_map = rgb_map.to(device), depth_map.to(device) # [B,3,H,W]
-        print(rgb_map.shape)
-        label = label.float().reshape(len(label),1).to(device) # [B,1]
-        output = model(rgb_map, depth_map) # (gap, r, p, q)
-        pred = torch.where(output[1]>0.5, 1., 0.)
-        # print('r:\t',output[1].squeeze())
-        # print('pred:\t',pred.squeeze())
-        # print('label:\t',label.squeeze())
-        metric.update(pred, label)
-        local_acc = calc_acc(pred, label)
-        print ('Batch: {}\t ACC: {:.4f}\t'.format(i, local_acc))
-        print("--------------------------------------------------------------------------------------")
+    with torch.inference_mode():
+        # warm-up: keep compilation and cudnn autotuning out of the timing
+        rgb_static = torch.randn(test_cfg['batch_size'], 3, *test_cfg['rgb_size'], device=device)
+        depth_static = torch.randn(test_cfg['batch_size'], 1, *test_cfg['rgb_size'], device=device)
+        for _ in range(3):
+            with autocast():
+                model(rgb_static, depth_static)
+        # reduce-overhead compile already replays CUDA graphs by itself
+        graph = None
+        # early-exit shapes depend on the data, can't be captured; capturing a TRT engine is untested
+        if (test_cfg['cuda_graph'] and not use_compile and not test_cfg['tensorrt']
+                and not test_cfg['early_exit'] and device.type == 'cuda'):
+            graph, output_static = capture_graph(model, rgb_static, depth_static)
+        preds_all, labels_all = [], []
+        start_time = datetime.now()
+        # writer = SummaryWriter(cfg['log_dir'])
+        for i, (rgb_map, depth_map, label) in enumerate(test_loader):
+            label = label.float().reshape(len(label),1).to(device, non_blocking=True) # [B,1]
+            if graph is not None and rgb_map.shape == rgb_static.shape:
+                rgb_static.copy_(rgb_map, non_blocking=True)
+                depth_static.copy_(depth_map, non_blocking=True)
+                graph.replay()
+                output = output_static
+            else:   # eager, or the last incomplete batch
+                rgb_map = rgb_map.to(device, non_blocking=True)     # [B,3,H,W]
+                depth_map = depth_map.to(device, non_blocking=True) # [B,1,H,W]
+                with autocast():
+                    output = model(rgb_map, depth_map) # (gap, r, p, q)
+            pred = (output[1] > 0).float() # logit>0 <=> sigmoid>0.5
+            # print('r:\t',output[1].squeeze())
+            # print('pred:\t',pred.squeeze())
+            # print('label:\t',label.squeeze())
+            # stay on device, no host sync until the loop is done
+            preds_all.append(pred)
+            labels_all.append(label)
+        preds_all, labels_all = torch.cat(preds_all), torch.cat(labels_all)
+        acc = calc_acc(preds_all, labels_all).item()
+        metric.update(preds_all, labels_all)
     end_time = datetime.now()
     diff_time = (end_time - start_time).seconds
     hter, far, frr = metric.calc_HTER()
-    acc = metric.calc_ACC()
     print('Model: {}\n ACC: {:.4f}\t EER: {:.4f}\t HTER: {:.4f}\t TIME: {:.4f}'.format(test_cfg['model'], acc, 0, hter, diff_time))
     # writer.close()
\ No newline at end of file
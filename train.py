@@ -33,8 +33,9 @@ def create_model(cfg):
     model = None
     if cfg['train']['from'] == 'pretrain':
         model_name = ''
-        save_path = os.path.join(root_dir, 'model', 'save', model_name)
-        model = nn.load(save_path)
+        save_path = os.path.join(root_dir, 'exp', 'save', model_name)
+        model = RGBD_model(device).to(device)
+        model.load_state_dict(torch.load(save_path, map_location=device, weights_only=True))
         return model
     elif cfg['train']['from'] == 'scratch':
         model = RGBD_model(device).to(device)
@@ -47,9 +48,9 @@ def validate(model, val_loader, metric, device):
     metric.reset()
     with torch.no_grad():
         for i, (rgb_map, depth_map, label) in enumerate(val_loader): 
-            rgb_map, depth_map = rgb_map.to(device), depth_map.to(device) # [B,3,224,224]
+            rgb_map, depth_map = rgb_map.to(device), depth_map.to(device) # [B,3,224,224], [B,1,224,224]
             output = model(rgb_map, depth_map) # (gap, r, p, q)
-            pred = torch.where(output[1]>0.5, 1., 0.)
+            pred = (output[1] > 0).to(output[1].dtype) # logit>0 <=> sigmoid>0.5
             metric.update(pred, label)
     hter, far, frr = metric.calc_HTER()
     acc = metric.calc_ACC()
@@ -74,18 +75,18 @@ if __name__ == "__main__":
         transforms.RandomHorizontalFlip(),
         transforms.Resize(train_cfg['depth_size']),
         transforms.ToTensor(),
-        transforms.Normalize(data_cfg['mean'], data_cfg['std']),
+        transforms.Normalize(data_cfg['depth_mean'], data_cfg['depth_std']),
     ])
     train_set = CASIA_SURF(
         root_dir=os.path.join(root_dir, 'dataset', data_cfg['name'], 'train'),
         csv_file=data_cfg['train_csv'],
-        transform=[train_transform_rgb, train_transform_rgb],
+        transform=[train_transform_rgb, train_transform_d],
         # smoothing=True
     )
     val_set = CASIA_SURF(
         root_dir=os.path.join(root_dir, 'dataset', data_cfg['name'], 'val'),
         csv_file=data_cfg['val_csv'],
-        transform=[train_transform_rgb, train_transform_rgb],
+        transform=[train_transform_rgb, train_transform_d],
         # smoothing=True
     )
     train_loader = DataLoader(
@@ -108,7 +109,7 @@ if __name__ == "__main__":
     # for name,param in  model.named_parameters():
     #     param.requires_grad = True
     # optimizer = torch.optim.NAdam(filter(lambda p: p.requires_grad, model.parameters()), lr=optim_cfg['lr'], weight_decay=optim_cfg['wd'])
-    loss = Total_loss(device, lamb=loss_cfg['lamb'], alpha=loss_cfg['alpha'], gamma=loss_cfg['gamma']).to(device)
+    loss = Total_loss(device, lamb=loss_cfg['lamb'], alpha=loss_cfg['alpha'], gamma=loss_cfg['gamma'], compile=loss_cfg['compile']).to(device)
     optimizer = torch.optim.NAdam(model.parameters(), lr=optim_cfg['lr'], weight_decay=optim_cfg['wd'])
     scheduler = MultiStepLR(optimizer, milestones=[10,20,30,40,50,60,70,80,90], gamma=0.5)
     metric = FASMetric()
@@ -134,5 +135,5 @@ if __name__ == "__main__":
     # save model
     save_time = time.strftime("%Y-%m-%d %H-%M", time.localtime())
     save_path = os.path.join(root_dir, 'exp', 'save', '{}_{}.pth'.format(save_time, train_cfg['net']))
-    torch.save(model, save_path) # torch.save(model.state_dict(), save_path)
+    torch.save(model.state_dict(), save_path)
     print('Saved model: {}'.format(save_path))
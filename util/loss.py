@@ -4,18 +4,18 @@ import torch.nn.functional as func
 
 
 class Total_loss(nn.Module):
-	def __init__(self, device, lamb=0.5, alpha=1, gamma=3):
+	def __init__(self, device, lamb=0.5, alpha=1, gamma=3, compile=False):
 		super(Total_loss, self).__init__()
 		self.lamb = lamb
-		self.bcel = nn.BCELoss()
-		self.cmfl = CMFLoss(alpha, gamma)
+		self.bcel = nn.BCEWithLogitsLoss()
+		self.cmfl = CMFLoss(alpha, gamma, compile=compile)
 
 	def forward(self, p, q, r, targets):
 		"""
 		Args:
-			p: prob of live in rgb branch	[B,1]
-			q: prob of live in depth branch	[B,1]
-			r: prob of live in joint branch	[B,1]
+			p: logit of live in rgb branch	[B,1]
+			q: logit of live in depth branch	[B,1]
+			r: logit of live in joint branch	[B,1]
 			targets: {0:fake, 1:live}
 		"""
 		bcel_r = self.bcel(r, targets) 		# CE(rt) = BCE(r)
@@ -25,43 +25,54 @@ class Total_loss(nn.Module):
 		error = (1-self.lamb)*bcel_r + self.lamb*cmfl_pq
 		return error
 
+def _cmfl_kernel(p, q, targets, alpha, gamma, eps):
+	"""
+	Elementwise CMFL(pt,qt) and CMFL(qt,pt), fused into a single kernel when compiled
+	Args:
+		p, q: logits of live
+	"""
+	# stable log-sum-exp form of BCE(sigmoid(p))
+	bce_loss_p = func.binary_cross_entropy_with_logits(p, targets, reduction='none') # CE(pt) = BCE(p)
+	bce_loss_q = func.binary_cross_entropy_with_logits(q, targets, reduction='none')
+
+	pt = torch.exp(-bce_loss_p)	# prob of the target class in rgb branch
+	qt = torch.exp(-bce_loss_q)
+
+	cmfl_pq = alpha * (1-_w(pt, qt, eps))**gamma * bce_loss_p	# CMFL(pt,qt)
+	cmfl_qp = alpha * (1-_w(qt, pt, eps))**gamma * bce_loss_q
+	return cmfl_pq, cmfl_qp
+
+
+def _w(pt, qt, eps):
+	"""
+	Depends on the probabilities given by the channels from two individual branches
+	"""
+	return ((qt + eps)*(2*pt*qt))/(pt + qt + eps)
+
+
 class CMFLoss(nn.Module):
 	"""
 	Cross Modal Focal Loss
 	"""
-	def __init__(self, alpha, gamma):
+	def __init__(self, alpha, gamma, compile=False):
 		"""
 		Args:
 			alpha: alpha balanced
 			gamma: tunnable focusing parameter. modulating factor is (1-pt)**gamma = (1-w(pt,qt)**gamma)
 			multiplier: num of branches
+			compile: fuse the elementwise math with torch.compile (needs Inductor/Triton)
 		"""
 		super(CMFLoss, self).__init__()
 		self.alpha = alpha
 		self.gamma = gamma
+		self.kernel = torch.compile(_cmfl_kernel, dynamic=True) if compile else _cmfl_kernel
 	
 	def forward(self, p, q, targets):
 		""""
         Args:
-            p: prob of live in rgb branch. 		[B,1]
-            q: prob of live in depth branch. 	[B,1]
-            r: prob of live in joint branch. 	[B,1]
+            p: logit of live in rgb branch. 	[B,1]
+            q: logit of live in depth branch. 	[B,1]
         """
-		bce_loss_p = func.binary_cross_entropy(p, targets, reduce=False) # CE(pt) = BCE(p)
-		bce_loss_q = func.binary_cross_entropy(q, targets, reduce=False)
-
-		pt = torch.exp(-bce_loss_p)	# prob of the target class in rgb branch
-		qt = torch.exp(-bce_loss_q)
-
-		cmfl_pq = self.alpha * (1-self.w(pt, qt))**self.gamma * bce_loss_p	# CMFL(pt,qt)
-		cmfl_qp = self.alpha * (1-self.w(qt, pt))**self.gamma * bce_loss_q
+		cmfl_pq, cmfl_qp = self.kernel(p, q, targets, self.alpha, self.gamma, 1e-8)
 		cmfl = 0.5*torch.mean(cmfl_pq) + 0.5*torch.mean(cmfl_qp) 
 		return cmfl
-
-	def w(self, pt, qt):
-		"""
-		Depends on the probabilities given by the channels from two individual branches
-		"""
-		eps = 1e-8
-		w = ((qt + eps)*(2*pt*qt))/(pt + qt + eps)
-		return w
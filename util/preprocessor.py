@@ -31,10 +31,10 @@ class CASIA_SURF(Dataset):
         """
         rgb_path, depth_path, label = self.data.iloc[index, 0], self.data.iloc[index, 1], self.data.iloc[index, 3]
         rgb_img = cv2.imread(os.path.join(self.root_dir, rgb_path), cv2.IMREAD_COLOR)
-        depth_img = cv2.imread(os.path.join(self.root_dir, depth_path))
+        depth_img = cv2.imread(os.path.join(self.root_dir, depth_path), cv2.IMREAD_GRAYSCALE)
         # gbr => rgb
         rgb_img = cv2.cvtColor(rgb_img, cv2.COLOR_BGR2RGB)
-        depth_img = cv2.cvtColor(depth_img, cv2.COLOR_BGR2RGB)
+        depth_img = depth_img[:, :, np.newaxis]  # [H,W] -> [H,W,1]
         # [H,W,C] -> [C,H,W]
         rgb_map = self.transform[0](rgb_img)
         depth_map = self.transform[1](depth_img)
@@ -70,10 +70,10 @@ class CASIA_CEFA(Dataset):
         path_list[2] = 'depth'
         depth_path = '/'.join(path_list)
         rgb_img = cv2.imread(os.path.join(self.root_dir, rgb_path), cv2.IMREAD_COLOR)
-        depth_img = cv2.imread(os.path.join(self.root_dir, depth_path))
+        depth_img = cv2.imread(os.path.join(self.root_dir, depth_path), cv2.IMREAD_GRAYSCALE)
         # gbr => rgb
         rgb_img = cv2.cvtColor(rgb_img, cv2.COLOR_BGR2RGB)
-        depth_img = cv2.cvtColor(depth_img, cv2.COLOR_BGR2RGB)
+        depth_img = depth_img[:, :, np.newaxis]  # [H,W] -> [H,W,1]
         # [H,W,C] -> [C,H,W]
         rgb_map = self.transform[0](rgb_img)
         depth_map = self.transform[1](depth_img)
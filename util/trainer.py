@@ -48,7 +48,7 @@ class Trainer():
             output = self.model(rgb_map, depth_map) # (gap, r, p, q)
             label = label.float().unsqueeze(1).to(self.device)	# [B] -> [B,1]
             self.optimizer.step() # gradient descent
-            pred = torch.where(output[1]>0.5, 1., 0.)
+            pred = (output[1] > 0).to(output[1].dtype) # logit>0 <=> sigmoid>0.5
             self.metric.update(pred, label)
         hter, far, frr = self.metric.calc_HTER()
         # err = if far==frr 1 else 0
@@ -58,5 +58,5 @@ class Trainer():
     def save(self):
         save_time = time.strftime("%Y-%m-%d %H-%M", time.localtime())
         save_path = os.path.join(self.root_dir, 'exp', 'save', '{}_{}.pth'.format(save_time, self.train_cfg['net']))
-        torch.save(self.model, save_path) # torch.save(model.state_dict(), save_path)
+        torch.save(self.model.state_dict(), save_path)
         print('Saved model: {}'.format(save_path))
\ No newline at end of file